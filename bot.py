@@ -1,5 +1,16 @@
+import asyncio
+import functools
+import itertools
+import json
 import os
+import pickle
+import queue
 import random
+import sqlite3
+import sys
+import threading
+import time
+from typing import NamedTuple
 from telegram.ext import Application, CommandHandler, CallbackQueryHandler
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from pyairtable import Api
@@ -8,83 +19,195 @@ from pyairtable import Api
 from dotenv import load_dotenv
 load_dotenv()
 
+# Local snapshot of the parsed Airtable data, reloaded on cold start so the
+# bot doesn't have to re-download every record when nothing changed
+CACHE_FILE = '.words_cache.pkl'
+
+# Convert case codes to full names
+CASE_MAPPING = {
+    'A': 'accusative',
+    'D': 'dative',
+    'G': 'genitive'
+}
+
+class WordEntry(NamedTuple):
+    """One word + preposition combination parsed from Airtable
+
+    A NamedTuple instead of a per-record dict: no hash table per word, so
+    thousands of records take a fraction of the memory.
+    """
+    word: str
+    preposition: str
+    case: str
+    example: str
+    wrong_options: tuple
+    all_options: tuple
+    difficulty: str
+    english_translation: str
+    example_de: str
+    original_prep_format: str
+    record_id: str
+
+def _ftext(value):
+    """Extract stripped text from an Airtable field value
+
+    Plain-text columns arrive as strings, but some field types come back as
+    dicts with a 'value' or 'text' entry; always return a plain str.
+    """
+    if not value:
+        return ''
+    if type(value) is dict:
+        value = value.get('value') or value.get('text', '')
+    return str(value).strip()
+
 class GermanVerbBot:
+    # Common German prepositions (accusative, dative and two-way) used as
+    # the distractor pool for wrong answer options
+    _ALL_PREPS = ('auf', 'für', 'gegen', 'durch', 'ohne', 'um', 'an', 'über',
+                  'mit', 'von', 'zu', 'bei', 'nach', 'aus', 'vor', 'in',
+                  'unter', 'zwischen', 'neben', 'hinter')
+
+    # Umlauts that bump a word to advanced difficulty
+    _UMLAUTS = frozenset('äöü')
+
     def __init__(self, token, airtable_api_key, airtable_base_id):
-        self.app = Application.builder().token(token).build()
-        self.current_quiz = {}  # Store current quiz for each user
-        self.user_stats = {}    # Store user statistics
-        
+        # Process each update in its own task; without this the update
+        # fetcher awaits every handler to completion, so a slow /refresh
+        # would stall queued quizzes and button callbacks anyway
+        self.app = (Application.builder().token(token)
+                    .concurrent_updates(True)
+                    .post_init(self._post_init)
+                    .build())
+        self._debug = bool(os.getenv('BOT_DEBUG'))
+
+        # Persist quiz state and user statistics in SQLite so they survive
+        # restarts and don't keep every user who ever played in memory
+        self.db = sqlite3.connect('bot.db', check_same_thread=False)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS user_stats (
+                user_id INTEGER PRIMARY KEY,
+                total_questions INTEGER NOT NULL DEFAULT 0,
+                correct_answers INTEGER NOT NULL DEFAULT 0,
+                streak INTEGER NOT NULL DEFAULT 0,
+                best_streak INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS current_quiz (
+                user_id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL
+            )
+        """)
+        self.db.commit()
+
         # Initialize Airtable
         self.api = Api(airtable_api_key)
         self.verbs_table = self.api.table(airtable_base_id, 'MainDB')  # Updated to your table name
-        
-        # Load words data from Airtable
-        self.words_data = self.load_words_from_airtable()
-        print(f"Loaded {len(self.words_data)} words from Airtable")
-        
+
+        # Lazily built candidate pools for generate_wrong_options, one per
+        # distinct correct preposition (~20) instead of one per record
+        self._wrong_pools = {}
+        
+        # Load words data from the local cache if available, else Airtable;
+        # a cache hit is reconciled with Airtable in the background once the
+        # bot is up (see _post_init)
+        loaded = self.load_cached_words()
+        self._started_from_cache = loaded is not None
+        if loaded is None:
+            try:
+                loaded = self.load_words_from_airtable()
+            except Exception as e:
+                # No data at all yet - only here is the fallback acceptable
+                print(f"Error loading from Airtable: {e}")
+                loaded = self._fallback_words()
+        self.words_data, self.alternatives_by_word, self._word_keys = loaded
+        print(f"Loaded {len(self.words_data)} words")
+
+        # Static menus are identical for every user, so build each keyboard
+        # once and reuse the same instance in every message
+        self._main_menu = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🎯 Start Quiz", callback_data="quiz_beginner")],
+            [InlineKeyboardButton("📊 My Stats", callback_data="show_stats")],
+            [InlineKeyboardButton("📚 Help", callback_data="help")]
+        ])
+        self._help_menu = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🎯 Start Quiz", callback_data="quiz_beginner")],
+            [InlineKeyboardButton("📊 My Stats", callback_data="show_stats")]
+        ])
+        self._stats_menu = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🎯 New Quiz", callback_data="quiz_beginner")],
+            [InlineKeyboardButton("🔄 Refresh Stats", callback_data="show_stats")]
+        ])
+        self._result_menu = InlineKeyboardMarkup([
+            [InlineKeyboardButton("🔄 New Quiz", callback_data="quiz_beginner")],
+            [InlineKeyboardButton("📊 My Stats", callback_data="show_stats")]
+        ])
+
         self.setup_handlers()
-    
-    def parse_preposition_case(self, prep_string):
-        """Parse 'auf + A' format into preposition and case"""
+
+    async def _post_init(self, application):
+        """Kick off a background Airtable reload after a cache-hit start
+
+        The cached snapshot gets the bot answering immediately, but it may be
+        stale; schedule the reload as a task so startup isn't blocked on it.
+        """
+        if self._started_from_cache:
+            application.create_task(self.refresh_words_data())
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def parse_preposition_case(prep_string):
+        """Parse 'auf + A' format into preposition and case
+
+        Many records share the same raw preposition string, so results are
+        memoized to skip repeated normalization during the Airtable load.
+        """
         if not prep_string:
             return None, None
-        
+
         # Clean up the string and handle common formatting issues
         prep_string = prep_string.replace('+', ' + ').strip()  # Fix "über+A" -> "über + A"
         prep_string = ' '.join(prep_string.split())  # Remove extra spaces
-            
+
         if ' + ' not in prep_string:
             return None, None
-            
+
         parts = prep_string.split(' + ')
         if len(parts) != 2:
             return None, None
-            
+
         preposition = parts[0].strip()
         case_code = parts[1].strip().upper()
-        
-        # Convert case codes to full names
-        case_mapping = {
-            'A': 'accusative',
-            'D': 'dative', 
-            'G': 'genitive'
-        }
-        
-        case = case_mapping.get(case_code, 'unknown')
+
+        case = CASE_MAPPING.get(case_code, 'unknown')
         return preposition, case
     
     def generate_wrong_options(self, correct_preposition):
         """Generate plausible wrong prepositions"""
-        # Common German prepositions categorized by what they're often confused with
-        common_prepositions = {
-            'accusative': ['auf', 'für', 'gegen', 'durch', 'ohne', 'um', 'an', 'über'],
-            'dative': ['mit', 'von', 'zu', 'bei', 'nach', 'aus', 'vor', 'an'],
-            'both': ['in', 'über', 'unter', 'zwischen', 'neben', 'hinter', 'vor']
-        }
-        
-        all_preps = set()
-        for prep_list in common_prepositions.values():
-            all_preps.update(prep_list)
-        
-        # Remove the correct preposition
-        all_preps.discard(correct_preposition)
-        
-        # Return 3 random wrong options
-        return random.sample(list(all_preps), min(3, len(all_preps)))
+        pool = self._wrong_pools.get(correct_preposition)
+        if pool is None:
+            pool = [p for p in self._ALL_PREPS if p != correct_preposition]
+            self._wrong_pools[correct_preposition] = pool
+
+        # Return 3 random wrong options (still a fresh sample per record)
+        return random.sample(pool, min(3, len(pool)))
 
     def get_alternative_prepositions(self, word, current_preposition):
         """Find other valid prepositions for the same word"""
-        alternatives = []
-        for key, data in self.words_data.items():
-            if (data['word'] == word and 
-                data['preposition'] != current_preposition):
-                alternatives.append({
-                    'preposition': data['preposition'],
-                    'prep_format': data['original_prep_format'],
-                    'example': data.get('example_de') or data['example'],
-                    'english': data.get('english_translation', '')
-                })
-        return alternatives
+        return [alt for alt in self.alternatives_by_word.get(word, ())
+                if alt['preposition'] != current_preposition]
+
+    def build_alternatives_index(self, words_data):
+        """Index word -> list of preposition entries for O(1) alternative lookup"""
+        alternatives_by_word = {}
+        for data in words_data.values():
+            alternatives_by_word.setdefault(data.word, []).append({
+                'preposition': data.preposition,
+                'prep_format': data.original_prep_format,
+                'example': data.example_de or data.example,
+                'english': data.english_translation
+            })
+        return alternatives_by_word
     
     def create_example_sentence(self, word, preposition, english_translation):
         """Create an example sentence from available data"""
@@ -93,114 +216,253 @@ class GermanVerbBot:
         else:
             return f"Ich {word} {preposition} etwas."
     
-    def load_words_from_airtable(self):
-        """Load all words from Airtable and convert to our format"""
+    def load_cached_words(self):
+        """Load (words_data, alternatives index, key list) from the local
+        cache file, or None if unavailable
+
+        A cache hit only bridges startup: _post_init schedules a full
+        Airtable reload in the background, and /refresh rewrites the cache.
+        """
         try:
-            # Get ALL records (handle pagination automatically)
-            records = self.verbs_table.all()
-            words_data = {}
-            skipped_count = 0
-            
-            print(f"Found {len(records)} total records in Airtable")
-            
-            for record in records:
-                fields = record['fields']
-                
-                # Debug: print first few records to see structure
-                if len(words_data) < 3:
-                    print(f"Record fields: {list(fields.keys())}")
-                
-                # Skip records that don't have required fields (but count them)
-                if 'Word' not in fields or 'Preposition' not in fields:
-                    skipped_count += 1
-                    if skipped_count <= 5:  # Show first few skipped records
-                        print(f"Skipped record - missing fields. Has: {list(fields.keys())}")
-                    continue
-                
-                word = str(fields['Word']).strip() if fields['Word'] else ""
-                prep_string = str(fields['Preposition']).strip() if fields['Preposition'] else ""
-                
-                # Skip if values are empty
-                if not word or not prep_string:
-                    skipped_count += 1
-                    continue
-                
-                # Handle English translation and example - extract text if they're complex objects
-                english_translation = fields.get('English Translation', '')
-                if isinstance(english_translation, dict):
-                    english_translation = english_translation.get('value', '') or english_translation.get('text', '')
-                english_translation = str(english_translation).strip() if english_translation else ""
-                
-                example_de = fields.get('Example DE', '')
-                if isinstance(example_de, dict):
-                    example_de = example_de.get('value', '') or example_de.get('text', '')
-                example_de = str(example_de).strip() if example_de else ""
+            with open(CACHE_FILE, 'rb') as f:
+                cached_at, words_data = pickle.load(f)
+            # Ignore caches not holding a dict of WordEntry records, e.g.
+            # written by an older version of the bot
+            if not words_data or not isinstance(next(iter(words_data.values())), WordEntry):
+                return None
+        except (OSError, pickle.PickleError, ValueError, TypeError,
+                EOFError, AttributeError):
+            return None
+
+        print(f"Loaded {len(words_data)} words from cache (saved {time.ctime(cached_at)})")
+        return words_data, self.build_alternatives_index(words_data), list(words_data)
+
+    def save_words_cache(self, words_data):
+        """Persist words data to the local cache file for fast cold starts"""
+        try:
+            with open(CACHE_FILE, 'wb') as f:
+                pickle.dump((time.time(), words_data), f)
+        except OSError as e:
+            print(f"Could not write words cache: {e}")
+
+    def _iterate_pages_prefetched(self):
+        """Yield record pages while the next page is fetched in the background
+
+        Airtable pagination uses opaque offset cursors (each page's offset
+        comes from the previous response), so pages can't be requested in
+        parallel. Prefetching one page ahead in a worker thread still overlaps
+        every HTTP round-trip with parsing of the page already in hand.
+        """
+        pages = queue.Queue(maxsize=2)
+        done = object()
+
+        def fetch():
+            try:
+                for page in self.verbs_table.iterate(
+                    fields=['Word', 'Preposition', 'English Translation', 'Example DE'],
+                    page_size=100
+                ):
+                    pages.put(page)
+                pages.put(done)
+            except Exception as e:
+                pages.put(e)
+
+        threading.Thread(target=fetch, daemon=True).start()
+        while True:
+            page = pages.get()
+            if page is done:
+                return
+            if isinstance(page, Exception):
+                raise page
+            yield page
+
+    def load_words_from_airtable(self):
+        """Load all words from Airtable and convert to our format
+
+        Returns (words_data, alternatives index, key list) without touching
+        any attributes, so callers on the event loop can swap all three in
+        together - a refresh running in a worker thread must not leave the
+        key list and the words dict pointing at different generations.
+
+        Raises on network/Airtable errors instead of falling back: a caller
+        that already holds good data must keep it rather than replace it.
+        """
+        words_data = {}
+        record_count = 0
+        skipped_missing = 0
+        skipped_empty = 0
+        skipped_unparsable = 0
+
+        # Stream records page by page (handles pagination automatically),
+        # fetching only the columns the bot uses to keep each page's
+        # payload small and peak memory at one page instead of all records
+        record_pages = self._iterate_pages_prefetched()
+        for record in itertools.chain.from_iterable(record_pages):
+            record_count += 1
+            fields = record['fields']
+
+            # Debug: print first few records to see structure
+            if self._debug and len(words_data) < 3:
+                print(f"Record fields: {list(fields.keys())}")
+
+            # Skip records that don't have required fields (but count them)
+            if 'Word' not in fields or 'Preposition' not in fields:
+                skipped_missing += 1
+                if self._debug and skipped_missing <= 5:  # Show first few skipped records
+                    print(f"Skipped record - missing fields. Has: {list(fields.keys())}")
+                continue
+
+            word = str(fields['Word']).strip() if fields['Word'] else ""
+            prep_string = str(fields['Preposition']).strip() if fields['Preposition'] else ""
+
+            # Skip if values are empty
+            if not word or not prep_string:
+                skipped_empty += 1
+                continue
                 
-                # Parse preposition and case
-                preposition, case = self.parse_preposition_case(prep_string)
-                if not preposition or not case:
-                    skipped_count += 1
-                    if skipped_count <= 5:
-                        print(f"Skipped {word} - couldn't parse preposition: {prep_string}")
-                    continue
+            # Handle English translation and example - extract text if they're complex objects
+            english_translation = _ftext(fields.get('English Translation'))
+            example_de = _ftext(fields.get('Example DE'))
                 
-                # Generate wrong options
-                wrong_options = self.generate_wrong_options(preposition)
+            # Parse preposition and case
+            preposition, case = self.parse_preposition_case(prep_string)
+            if not preposition or not case:
+                skipped_unparsable += 1
+                if self._debug and skipped_unparsable <= 5:
+                    print(f"Skipped {word} - couldn't parse preposition: {prep_string}")
+                continue
                 
-                # Use provided German example or create one
-                if example_de:
-                    example = example_de
-                else:
-                    example = self.create_example_sentence(word, preposition, english_translation)
+            # Generate wrong options
+            wrong_options = self.generate_wrong_options(preposition)
                 
-                # Determine difficulty based on word complexity
-                difficulty = 'beginner'
-                if word.startswith('sich ') or len(word) > 8:
-                    difficulty = 'intermediate'
-                if 'ä' in word or 'ö' in word or 'ü' in word:
-                    difficulty = 'advanced'
+            # Use provided German example or create one
+            if example_de:
+                example = example_de
+            else:
+                example = self.create_example_sentence(word, preposition, english_translation)
                 
-                # Create unique key for word + preposition combinations
-                unique_key = f"{word}_{preposition}"
+            # Determine difficulty based on word complexity
+            difficulty = 'beginner'
+            if word.startswith('sich ') or len(word) > 8:
+                difficulty = 'intermediate'
+            if not self._UMLAUTS.isdisjoint(word):
+                difficulty = 'advanced'
                 
-                words_data[unique_key] = {
-                    'word': word,  # Store original word separately
-                    'preposition': preposition,
-                    'case': case,
-                    'example': example,
-                    'wrong_options': wrong_options,
-                    'difficulty': difficulty,
-                    'english_translation': english_translation,
-                    'example_de': example_de,  # Store the German example
-                    'original_prep_format': prep_string,
-                    'record_id': record['id']
-                }
-            
-            print(f"Successfully loaded: {len(words_data)} words")
-            print(f"Skipped: {skipped_count} records")
-            
-            return words_data
+            # Create unique key for word + preposition combinations
+            unique_key = f"{word}_{preposition}"
+
+            # These fields repeat heavily across records (3 cases, 3
+            # difficulties, ~20 prepositions), so intern them to share a
+            # single str object per distinct value
+            words_data[unique_key] = WordEntry(
+                word=word,
+                preposition=sys.intern(preposition),
+                case=sys.intern(case),
+                example=example,
+                wrong_options=tuple(wrong_options),
+                all_options=(preposition, *wrong_options),
+                difficulty=sys.intern(difficulty),
+                english_translation=english_translation,
+                example_de=example_de,  # Store the German example
+                original_prep_format=sys.intern(prep_string),
+                record_id=record['id']
+            )
             
+        # Single summary line instead of per-record output
+        print(f"Processed {record_count} records: {len(words_data)} loaded, "
+              f"skipped {skipped_missing} missing fields, "
+              f"{skipped_empty} empty, {skipped_unparsable} unparsable")
+
+        self.save_words_cache(words_data)
+        return words_data, self.build_alternatives_index(words_data), list(words_data)
+
+    def _fallback_words(self):
+        """Minimal built-in data for when no words can be loaded at all"""
+        fallback_data = {
+            "achten": WordEntry(
+                word="achten",
+                preposition="auf",
+                case="accusative",
+                example="I pay attention to something. (Ich achte auf etwas.)",
+                wrong_options=("für", "mit", "über"),
+                all_options=("auf", "für", "mit", "über"),
+                difficulty="beginner",
+                english_translation="pay attention to",
+                example_de="",
+                original_prep_format="auf + A",
+                record_id=""
+            )
+        }
+        return fallback_data, self.build_alternatives_index(fallback_data), list(fallback_data)
+
+    async def refresh_words_data(self):
+        """Refresh words data from Airtable
+
+        The blocking Airtable pull runs in a worker thread so the event loop
+        keeps answering quizzes and button clicks during the reload. The
+        words dict and its derived indexes are swapped in together here on
+        the loop thread, never piecemeal from the worker. If the load fails,
+        the data already being served is kept untouched.
+        """
+        try:
+            loaded = await asyncio.to_thread(self.load_words_from_airtable)
         except Exception as e:
-            print(f"Error loading from Airtable: {e}")
-            # Fallback data in case Airtable is unavailable
-            return {
-                "achten": {
-                    "preposition": "auf",
-                    "case": "accusative",
-                    "example": "I pay attention to something. (Ich achte auf etwas.)",
-                    "wrong_options": ["für", "mit", "über"],
-                    "difficulty": "beginner",
-                    "english_translation": "pay attention to",
-                    "original_prep_format": "auf + A"
-                }
-            }
-    
-    def refresh_words_data(self):
-        """Refresh words data from Airtable"""
-        self.words_data = self.load_words_from_airtable()
+            print(f"Refresh failed, keeping {len(self.words_data)} current words: {e}")
+            return
+        self.words_data, self.alternatives_by_word, self._word_keys = loaded
         print(f"Refreshed: {len(self.words_data)} words loaded")
     
+    def get_user_stats(self, user_id):
+        """Fetch a user's statistics, defaulting to zeros for new users"""
+        row = self.db.execute(
+            "SELECT total_questions, correct_answers, streak, best_streak "
+            "FROM user_stats WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return {
+                'total_questions': 0,
+                'correct_answers': 0,
+                'streak': 0,
+                'best_streak': 0
+            }
+        return {
+            'total_questions': row[0],
+            'correct_answers': row[1],
+            'streak': row[2],
+            'best_streak': row[3]
+        }
+
+    def save_user_stats(self, user_id, stats):
+        """Write a user's statistics back to the database"""
+        self.db.execute(
+            "INSERT OR REPLACE INTO user_stats "
+            "(user_id, total_questions, correct_answers, streak, best_streak) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (user_id, stats['total_questions'], stats['correct_answers'],
+             stats['streak'], stats['best_streak'])
+        )
+        self.db.commit()
+
+    def get_current_quiz(self, user_id):
+        """Fetch the user's active quiz, or None if they have none"""
+        row = self.db.execute(
+            "SELECT payload FROM current_quiz WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set_current_quiz(self, user_id, quiz_data):
+        """Store the user's active quiz"""
+        self.db.execute(
+            "INSERT OR REPLACE INTO current_quiz (user_id, payload) VALUES (?, ?)",
+            (user_id, json.dumps(quiz_data))
+        )
+        self.db.commit()
+
+    def clear_current_quiz(self, user_id):
+        """Remove the user's active quiz"""
+        self.db.execute("DELETE FROM current_quiz WHERE user_id = ?", (user_id,))
+        self.db.commit()
+
     def setup_handlers(self):
         self.app.add_handler(CommandHandler("start", self.start))
         self.app.add_handler(CommandHandler("quiz", self.quiz))
@@ -210,24 +472,17 @@ class GermanVerbBot:
         # Handle button clicks
         self.app.add_handler(CallbackQueryHandler(self.handle_button_click))
     
+    async def _send(self, update, text, reply_markup):
+        """Edit the originating message for callbacks, otherwise reply"""
+        query = update.callback_query
+        if query is not None:
+            await query.edit_message_text(text, reply_markup=reply_markup)
+        else:
+            await update.message.reply_text(text, reply_markup=reply_markup)
+
     async def start(self, update, context):
-        user_id = update.effective_user.id
-        # Initialize user stats
-        if user_id not in self.user_stats:
-            self.user_stats[user_id] = {
-                'total_questions': 0,
-                'correct_answers': 0,
-                'streak': 0,
-                'best_streak': 0
-            }
-        
-        keyboard = [
-            [InlineKeyboardButton("🎯 Start Quiz", callback_data="quiz_beginner")],
-            [InlineKeyboardButton("📊 My Stats", callback_data="show_stats")],
-            [InlineKeyboardButton("📚 Help", callback_data="help")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+        reply_markup = self._main_menu
+
         welcome_text = f"""
 🇩🇪 Welcome to German Preposition Practice Bot!
 
@@ -239,12 +494,8 @@ I'll help you practice German words with prepositions using your Airtable databa
         await update.message.reply_text(welcome_text, reply_markup=reply_markup)
     
     async def help(self, update, context):
-        keyboard = [
-            [InlineKeyboardButton("🎯 Start Quiz", callback_data="quiz_beginner")],
-            [InlineKeyboardButton("📊 My Stats", callback_data="show_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+        reply_markup = self._help_menu
+
         help_text = """
 📚 **How to use this bot:**
 
@@ -265,30 +516,15 @@ I'll help you practice German words with prepositions using your Airtable databa
 Click a button below to get started!
         """
         
-        if hasattr(update, 'callback_query'):
-            await update.callback_query.edit_message_text(help_text, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(help_text, reply_markup=reply_markup)
+        await self._send(update, help_text, reply_markup)
     
     async def stats(self, update, context):
         user_id = update.effective_user.id
-        if user_id not in self.user_stats:
-            self.user_stats[user_id] = {
-                'total_questions': 0,
-                'correct_answers': 0,
-                'streak': 0,
-                'best_streak': 0
-            }
-        
-        stats = self.user_stats[user_id]
+        stats = self.get_user_stats(user_id)
         accuracy = (stats['correct_answers'] / max(stats['total_questions'], 1)) * 100
         
-        keyboard = [
-            [InlineKeyboardButton("🎯 New Quiz", callback_data="quiz_beginner")],
-            [InlineKeyboardButton("🔄 Refresh Stats", callback_data="show_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+        reply_markup = self._stats_menu
+
         stats_text = f"""
 📊 **Your Statistics**
 
@@ -302,15 +538,13 @@ Click a button below to get started!
 Keep practicing to improve your accuracy!
         """
         
-        if hasattr(update, 'callback_query'):
-            await update.callback_query.edit_message_text(stats_text, reply_markup=reply_markup)
-        else:
-            await update.message.reply_text(stats_text, reply_markup=reply_markup)
+        await self._send(update, stats_text, reply_markup)
     
     async def refresh_data(self, update, context):
         """Admin command to refresh data from Airtable"""
-        await update.message.reply_text("🔄 Refreshing word database from Airtable...")
-        self.refresh_words_data()
+        # One message after completion instead of a "refreshing..." message
+        # followed by a result - each message is a separate Telegram round-trip
+        await self.refresh_words_data()
         await update.message.reply_text(f"✅ Updated! Now have {len(self.words_data)} words loaded.")
     
     async def quiz(self, update, context):
@@ -319,32 +553,25 @@ Keep practicing to improve your accuracy!
     async def start_quiz(self, update):
         user_id = update.effective_user.id
         
-        # Use all words
-        available_words = self.words_data
-        
         # Pick a random word
-        unique_key = random.choice(list(available_words.keys()))
-        word_data = available_words[unique_key]
-        word = word_data['word']
-        
-        # Get preposition and wrong options
-        correct_prep = word_data["preposition"]
-        wrong_preps = word_data["wrong_options"]
-        
-        # Mix them up
-        all_options = [correct_prep] + wrong_preps
-        random.shuffle(all_options)
+        unique_key = random.choice(self._word_keys)
+        word_data = self.words_data[unique_key]
+        word = word_data.word
+
+        # Get the preposition and the pre-built answer pool, in random order
+        correct_prep = word_data.preposition
+        all_options = random.sample(word_data.all_options, len(word_data.all_options))
         
         # Store the quiz data for this user
-        self.current_quiz[user_id] = {
+        self.set_current_quiz(user_id, {
             'word': word,
             'correct_preposition': correct_prep,
-            'example': word_data["example"],
-            'case': word_data["case"],
-            'original_prep_format': word_data["original_prep_format"],
-            'english_translation': word_data.get("english_translation", ""),
-            'example_de': word_data.get("example_de", "")
-        }
+            'example': word_data.example,
+            'case': word_data.case,
+            'original_prep_format': word_data.original_prep_format,
+            'english_translation': word_data.english_translation,
+            'example_de': word_data.example_de
+        })
         
         # Create inline keyboard with preposition buttons
         keyboard = []
@@ -370,10 +597,7 @@ Keep practicing to improve your accuracy!
 📋 Choose the correct preposition:
         """
         
-        if hasattr(update, 'callback_query') and update.callback_query:
-            await update.callback_query.edit_message_text(quiz_text, reply_markup=reply_markup)
-        elif hasattr(update, 'message') and update.message:
-            await update.message.reply_text(quiz_text, reply_markup=reply_markup)
+        await self._send(update, quiz_text, reply_markup)
     
     async def handle_button_click(self, update, context):
         query = update.callback_query
@@ -381,16 +605,7 @@ Keep practicing to improve your accuracy!
         
         # Acknowledge the button click
         await query.answer()
-        
-        # Initialize user stats if needed
-        if user_id not in self.user_stats:
-            self.user_stats[user_id] = {
-                'total_questions': 0,
-                'correct_answers': 0,
-                'streak': 0,
-                'best_streak': 0
-            }
-        
+
         # Handle different button actions
         if query.data.startswith("quiz_"):
             await self.start_quiz(update)
@@ -406,31 +621,45 @@ Keep practicing to improve your accuracy!
     
     async def handle_quiz_answer(self, query, user_id):
         # Check if user has an active quiz
-        if user_id not in self.current_quiz:
+        quiz_data = self.get_current_quiz(user_id)
+        if quiz_data is None:
             await query.edit_message_text("Start a new quiz first!")
             return
-        
-        quiz_data = self.current_quiz[user_id]
-        
+
+        # Clear the quiz before the first await: updates are processed
+        # concurrently, so a double-click on an answer button must see no
+        # active quiz instead of counting the question twice
+        self.clear_current_quiz(user_id)
+
         # Extract the user's answer from callback data
         user_answer = query.data.replace("answer_", "")
-        
-        # Update stats
-        self.user_stats[user_id]['total_questions'] += 1
-        
+
+        # Bind the stats fields to locals once; every later access is a plain
+        # local read instead of a chained dict lookup
+        stats = self.get_user_stats(user_id)
+        total = stats['total_questions'] + 1
+        correct = stats['correct_answers']
+        streak = stats['streak']
+        best = stats['best_streak']
+
         # Check if answer is correct
         is_correct = user_answer == quiz_data['correct_preposition']
-        
+
         # Check for alternative valid prepositions for this word
         alternatives = self.get_alternative_prepositions(quiz_data['word'], quiz_data['correct_preposition'])
         user_found_alternative = any(alt['preposition'] == user_answer for alt in alternatives)
-        
+
+        # Update the counters up front so accuracy is computed exactly once
+        if is_correct or user_found_alternative:
+            correct += 1
+            streak += 1
+            if streak > best:
+                best = streak
+        else:
+            streak = 0
+        accuracy = correct / total * 100
+
         if is_correct:
-            self.user_stats[user_id]['correct_answers'] += 1
-            self.user_stats[user_id]['streak'] += 1
-            if self.user_stats[user_id]['streak'] > self.user_stats[user_id]['best_streak']:
-                self.user_stats[user_id]['best_streak'] = self.user_stats[user_id]['streak']
-            
             # Show additional context in success message
             context_info = ""
             if quiz_data.get("english_translation"):
@@ -447,16 +676,10 @@ Keep practicing to improve your accuracy!
 💭 {example_text}
 
 {context_info}
-🔥 Streak: {self.user_stats[user_id]['streak']}
-📊 Accuracy: {(self.user_stats[user_id]['correct_answers']/self.user_stats[user_id]['total_questions']*100):.1f}%
+🔥 Streak: {streak}
+📊 Accuracy: {accuracy:.1f}%
             """
         elif user_found_alternative:
-            # User chose a valid alternative preposition
-            self.user_stats[user_id]['correct_answers'] += 1
-            self.user_stats[user_id]['streak'] += 1
-            if self.user_stats[user_id]['streak'] > self.user_stats[user_id]['best_streak']:
-                self.user_stats[user_id]['best_streak'] = self.user_stats[user_id]['streak']
-            
             # Find the specific alternative they chose
             chosen_alt = next(alt for alt in alternatives if alt['preposition'] == user_answer)
             
@@ -478,12 +701,10 @@ The quiz was asking for: {quiz_data['word']} + {quiz_data['original_prep_format'
 💡 Both are correct! This word can take multiple prepositions with different meanings.
 
 {context_info}
-🔥 Streak: {self.user_stats[user_id]['streak']}
-📊 Accuracy: {(self.user_stats[user_id]['correct_answers']/self.user_stats[user_id]['total_questions']*100):.1f}%
+🔥 Streak: {streak}
+📊 Accuracy: {accuracy:.1f}%
             """
         else:
-            self.user_stats[user_id]['streak'] = 0
-            
             # Show additional context in error message
             context_info = ""
             if quiz_data.get("english_translation"):
@@ -507,21 +728,18 @@ The correct answer is: {quiz_data['word']} + {quiz_data['original_prep_format']}
 {context_info}{alternatives_text}
 
 💪 Keep practicing! 
-📊 Accuracy: {(self.user_stats[user_id]['correct_answers']/self.user_stats[user_id]['total_questions']*100):.1f}%
+📊 Accuracy: {accuracy:.1f}%
             """
         
-        # Create continue buttons
-        keyboard = [
-            [InlineKeyboardButton("🔄 New Quiz", callback_data="quiz_beginner")],
-            [InlineKeyboardButton("📊 My Stats", callback_data="show_stats")]
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        
+        reply_markup = self._result_menu
+
+        # Write the locals back and persist the updated stats in one pass
+        stats.update(total_questions=total, correct_answers=correct,
+                     streak=streak, best_streak=best)
+        self.save_user_stats(user_id, stats)
+
         # Edit the original message to show the result
         await query.edit_message_text(response, reply_markup=reply_markup)
-        
-        # Clear the quiz for this user
-        del self.current_quiz[user_id]
     
     def run(self):
         print("Bot is starting...")